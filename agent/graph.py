@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import asyncio
 import re
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Set
 
 from langgraph.graph import StateGraph, END
 from agent.state import AgentState
@@ -10,16 +11,53 @@ from agent.tools import (
     propose_trip_concepts,
     build_itinerary,
     estimate_budget,
+    estimate_totals,
     estimate_activity_cost,
     adjust_itinerary_for_budget,
     build_checklist,
 )
 
-def _push(state: AgentState, node: str, payload: Dict[str, Any]) -> AgentState:
-    h = state.get("history", [])
-    h.append({"node": node, **payload})
-    state["history"] = h
-    return state
+_DAYS_RE = re.compile(r"\b(\d{1,2})\s*-\s*day\b|\b(\d{1,2})\s*day\b")
+_BUDGET_RE = re.compile(r"\bbudget\s*\$?\s*(\d{3,6})\b|\bunder\s*\$?\s*(\d{3,6})\b")
+_TRAV_RE = re.compile(r"\bfor\s+(\d{1,2})\s+(people|persons|travelers)\b")
+
+_INTERESTS = ["food", "museums", "nature", "walk", "history", "shopping", "architecture", "coastal", "scenic", "art", "nightlife", "markets", "roadtrip"]
+_KEYWORDS = {
+    "region": ["europe", "asia", "americas"],
+    "pace": ["slow", "medium", "fast"],
+    "interest": _INTERESTS,
+    "month": ["january","february","march","april","may","june","july","august","september","october","november","december"],
+}
+_KEYWORD_CATEGORY = {word: cat for cat, words in _KEYWORDS.items() for word in words}
+
+def _trie_pattern(words) -> str:
+    # Factor shared prefixes ("ma(?:r(?:ch|kets)|y)") so the regex engine walks
+    # each prefix once per position instead of retrying every keyword
+    trie: Dict[str, Any] = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, Any]) -> str:
+        alts = [re.escape(ch) + emit(sub) for ch, sub in sorted(node.items()) if ch]
+        if "" in node:
+            # A keyword ends here; greedily try the longer ones first
+            return "(?:" + "|".join(alts) + ")?" if alts else ""
+        return alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+
+    return emit(trie)
+
+# Single left-to-right scan over every keyword; hits are bucketed via _KEYWORD_CATEGORY.
+# The zero-width lookahead tries every start position, so overlapping keywords
+# ("americasia") are all found, matching the old per-keyword substring checks.
+_KEYWORD_RE = re.compile(f"(?=({_trie_pattern(_KEYWORD_CATEGORY)}))")
+
+def _push(update: AgentState, node: str, payload: Dict[str, Any]) -> AgentState:
+    # Nodes return partial updates; the history reducer appends this entry
+    update["history"] = [{"node": node, **payload}]
+    return update
 
 def _safe_int(x, default):
     try:
@@ -27,8 +65,8 @@ def _safe_int(x, default):
     except Exception:
         return default
 
-def parse_request(state: AgentState) -> AgentState:
-    text = (state.get("user_request") or "").strip()
+async def parse_request(state: AgentState) -> AgentState:
+    text = (state.get("user_request") or "").strip().lower()
 
     # Defaults (demo-friendly)
     constraints: Dict[str, Any] = {
@@ -44,99 +82,99 @@ def parse_request(state: AgentState) -> AgentState:
     }
 
     # days
-    m = re.search(r"\b(\d{1,2})\s*-\s*day\b|\b(\d{1,2})\s*day\b", text.lower())
+    m = _DAYS_RE.search(text)
     if m:
         val = m.group(1) or m.group(2)
         constraints["days"] = _safe_int(val, constraints["days"])
 
     # budget
-    m = re.search(r"\bbudget\s*\$?\s*(\d{3,6})\b|\bunder\s*\$?\s*(\d{3,6})\b", text.lower())
+    m = _BUDGET_RE.search(text)
     if m:
         val = m.group(1) or m.group(2)
         constraints["budget"] = _safe_int(val, constraints["budget"])
 
     # travelers
-    m = re.search(r"\bfor\s+(\d{1,2})\s+(people|persons|travelers)\b", text.lower())
+    m = _TRAV_RE.search(text)
     if m:
         constraints["travelers"] = _safe_int(m.group(1), constraints["travelers"])
 
+    # Bucket hits per category; each choice below follows its list's priority order
+    hits: Dict[str, Set[str]] = {cat: set() for cat in _KEYWORDS}
+    for m in _KEYWORD_RE.finditer(text):
+        word = m.group(1)
+        hits[_KEYWORD_CATEGORY[word]].add(word)
+
     # region
-    for r in ["europe", "asia", "americas"]:
-        if r in text.lower():
-            constraints["region"] = r
-            break
+    region = next((k for k in _KEYWORDS["region"] if k in hits["region"]), None)
+    if region:
+        constraints["region"] = region
 
     # pace
-    for p in ["slow", "medium", "fast"]:
-        if p in text.lower():
-            constraints["pace"] = p
-            break
+    pace = next((k for k in _KEYWORDS["pace"] if k in hits["pace"]), None)
+    if pace:
+        constraints["pace"] = pace
 
     # interests (simple keyword scan)
-    possible = ["food", "museums", "nature", "walk", "history", "shopping", "architecture", "coastal", "scenic", "art", "nightlife", "markets", "roadtrip"]
-    found = [k for k in possible if k in text.lower()]
+    found = [k for k in _INTERESTS if k in hits["interest"]]
     if found:
         # Keep top 3 to avoid overfitting
         constraints["interests"] = found[:3]
 
     # month hint (optional)
-    for mo in ["january","february","march","april","may","june","july","august","september","october","november","december"]:
-        if mo in text.lower():
-            constraints["month_hint"] = mo.title()
-            break
+    month = next((k for k in _KEYWORDS["month"] if k in hits["month"]), None)
+    if month:
+        constraints["month_hint"] = month.title()
 
-    state["constraints"] = constraints
-    return _push(state, "parse_request", {"constraints": constraints})
+    return _push({"constraints": constraints}, "parse_request", {"constraints": constraints})
 
-def make_options(state: AgentState) -> AgentState:
+async def make_options(state: AgentState) -> AgentState:
     c = state["constraints"]
-    candidates = search_destinations(c.get("region"), c.get("interests", []))
+    # Table loads are blocking file I/O; keep them off the event loop
+    candidates = await asyncio.to_thread(search_destinations, c.get("region"), c.get("interests", []))
     options = propose_trip_concepts(c, candidates)
-    state["trip_options"] = options
-    return _push(state, "propose_options", {"options": options})
+    return _push({"trip_options": options}, "propose_options", {"options": options})
 
-def choose_destination(state: AgentState) -> AgentState:
+async def choose_destination(state: AgentState) -> AgentState:
     c = state["constraints"]
     options = state.get("trip_options", [])
 
     # Heuristic selection: lowest estimated total (rough)
+    dests = [opt["destination"] for opt in options]
     best = None
     best_total = float("inf")
+    if dests:
+        totals = estimate_totals(dests, c["days"], c["travelers"], c["flight_est_per_person"])
+        i = int(totals.argmin())
+        best = dests[i]
+        best_total = round(float(totals[i]), 2)
 
-    for opt in options:
-        dest = opt["destination"]
-        rough = estimate_budget(dest, c["days"], c["travelers"], c["flight_est_per_person"])
-        total = rough["total_est"]
-        if total < best_total:
-            best_total = total
-            best = dest
-
-    state["selected_destination"] = best
-    return _push(state, "choose_destination", {"selected_destination": best, "rough_total": best_total})
+    return _push({"selected_destination": best}, "choose_destination", {"selected_destination": best, "rough_total": best_total})
 
-def build_plan(state: AgentState) -> AgentState:
+async def build_plan(state: AgentState) -> AgentState:
     c = state["constraints"]
     dest = state["selected_destination"]
-    itinerary = build_itinerary(dest["city"], c["days"], c["interests"], c["pace"])
-    state["itinerary"] = itinerary
-    return _push(state, "build_itinerary", {"itinerary_preview": itinerary["plan"][:1]})
+    itinerary = await asyncio.to_thread(build_itinerary, dest["city"], c["days"], c["interests"], c["pace"])
+    return _push({"itinerary": itinerary}, "build_itinerary", {"itinerary_preview": itinerary["plan"][:1]})
 
-def compute_budget(state: AgentState) -> AgentState:
+async def compute_budget(state: AgentState) -> AgentState:
     c = state["constraints"]
     dest = state["selected_destination"]
     base = estimate_budget(dest, c["days"], c["travelers"], c["flight_est_per_person"])
     act = estimate_activity_cost(state["itinerary"])
     total = base["total_est"] + act
 
-    budget = {**base, "activities_est": act, "grand_total_est": round(total, 2), "within_budget": total <= c["budget"]}
-    state["budget"] = budget
-    return _push(state, "estimate_budget", {"budget": budget})
+    # estimate_budget hands back a fresh dict, so extend it in place
+    budget = base
+    budget["activities_est"] = act
+    budget["grand_total_est"] = round(total, 2)
+    budget["within_budget"] = total <= c["budget"]
+    return _push({"budget": budget}, "estimate_budget", {"budget": budget})
 
-def validate_and_adjust(state: AgentState) -> AgentState:
+async def validate_and_adjust(state: AgentState) -> AgentState:
     c = state["constraints"]
     budget = state["budget"]
     if budget["within_budget"]:
-        return _push(state, "validate_adjust", {"action": "no_change"})
+        return _push({}, "validate_adjust", {"action": "no_change"})
 
     # If over budget: reduce paid activities first
     over = budget["grand_total_est"] - c["budget"]
@@ -150,62 +188,70 @@ def validate_and_adjust(state: AgentState) -> AgentState:
         max_paid = 3
 
     itinerary = adjust_itinerary_for_budget(state["itinerary"], max_paid_activities=max_paid)
-    state["itinerary"] = itinerary
 
     # recompute budget
-    base = {k: budget[k] for k in ["lodging","food","local_transport","flights_est","total_est"]}
+    new_budget = {k: budget[k] for k in ("lodging", "food", "local_transport", "flights_est", "total_est")}
     act = estimate_activity_cost(itinerary)
-    grand = base["total_est"] + act
-    new_budget = {**base, "activities_est": act, "grand_total_est": round(grand, 2), "within_budget": grand <= c["budget"]}
-    state["budget"] = new_budget
+    grand = new_budget["total_est"] + act
+    new_budget["activities_est"] = act
+    new_budget["grand_total_est"] = round(grand, 2)
+    new_budget["within_budget"] = grand <= c["budget"]
+
+    return _push({"itinerary": itinerary, "budget": new_budget}, "validate_adjust", {"action": "reduced_paid_activities", "max_paid": max_paid, "new_budget": new_budget})
 
-    return _push(state, "validate_adjust", {"action": "reduced_paid_activities", "max_paid": max_paid, "new_budget": new_budget})
+async def make_checklist(state: AgentState) -> AgentState:
+    # Depends only on constraints + destination, so it runs alongside itinerary/budget
+    checklist = build_checklist(state["constraints"], state["selected_destination"])
+    return _push({"checklist": checklist}, "build_checklist", {"checklist": checklist})
 
-def finalize(state: AgentState) -> AgentState:
+async def finalize(state: AgentState) -> AgentState:
     c = state["constraints"]
     dest = state["selected_destination"]
     budget = state["budget"]
     itinerary = state["itinerary"]
-    checklist = build_checklist(c, dest)
-    state["checklist"] = checklist
+    checklist = state["checklist"]
+
+    interest_text = ", ".join(c.get("interests", [])) if c.get("interests") else "general"
+    region_text = c.get("region") or "any"
+
+    # Collect every output line and join once at the end
+    parts: List[str] = [
+        "## Vacation Plan",
+        f"**Destination:** {dest['city']}, {dest['country']}  ",
+        f"**Region preference:** {region_text}  ",
+        f"**Length:** {c['days']} days | **Travelers:** {c['travelers']}  ",
+        f"**Pace:** {c['pace']} | **Interests:** {interest_text}  ",
+        "",
+        "### Budget (estimates)",
+        f"- Flights: ${budget['flights_est']}",
+        f"- Lodging: ${budget['lodging']}",
+        f"- Food: ${budget['food']}",
+        f"- Local transport: ${budget['local_transport']}",
+        f"- Activities: ${budget['activities_est']}",
+        f"- **Grand total:** ${budget['grand_total_est']} (Budget: ${c['budget']})  ",
+        f"- **Within budget:** {budget['within_budget']}",
+        "",
+        "### Day-by-day itinerary",
+    ]
 
     # Format itinerary
-    lines: List[str] = []
+    parts_append = parts.append
+    parts_extend = parts.extend
     for day in itinerary["plan"]:
-        lines.append(f"**Day {day['day']}**")
-        if not day["items"]:
-            lines.append("- Free exploration / rest day")
+        parts_append(f"**Day {day['day']}**")
+        items = day["items"]
+        if not items:
+            parts_append("- Free exploration / rest day")
         else:
-            for it in day["items"]:
-                lines.append(f"- {it['name']} ({it['tag']}, ~{it['typical_hours']}h, est ${it['cost_est']})")
-        lines.append("")
+            parts_extend(f"- {it['name']} ({it['tag']}, ~{it['typical_hours']}h, est ${it['cost_est']})" for it in items)
+        parts_append("")
 
-    interest_text = ", ".join(c.get("interests", [])) if c.get("interests") else "general"
-    region_text = c.get("region") or "any"
+    parts_append("### Booking & prep checklist")
+    parts_extend(f"- {x}" for x in checklist)
+    parts_append("")
+    plan = "\n".join(parts)
 
-    plan = (
-        f"## Vacation Plan\n"
-        f"**Destination:** {dest['city']}, {dest['country']}  \n"
-        f"**Region preference:** {region_text}  \n"
-        f"**Length:** {c['days']} days | **Travelers:** {c['travelers']}  \n"
-        f"**Pace:** {c['pace']} | **Interests:** {interest_text}  \n\n"
-        f"### Budget (estimates)\n"
-        f"- Flights: ${budget['flights_est']}\n"
-        f"- Lodging: ${budget['lodging']}\n"
-        f"- Food: ${budget['food']}\n"
-        f"- Local transport: ${budget['local_transport']}\n"
-        f"- Activities: ${budget['activities_est']}\n"
-        f"- **Grand total:** ${budget['grand_total_est']} (Budget: ${c['budget']})  \n"
-        f"- **Within budget:** {budget['within_budget']}\n\n"
-        f"### Day-by-day itinerary\n"
-        + "\n".join(lines)
-        + "\n### Booking & prep checklist\n"
-        + "\n".join([f"- {x}" for x in checklist])
-        + "\n"
-    )
-
-    state["final_plan"] = plan
-    return _push(state, "finalize", {"final_plan_preview": plan[:300] + "..."})
+    return _push({"final_plan": plan}, "finalize", {"final_plan_preview": plan[:300] + "..."})
 
 def build_graph():
     g = StateGraph(AgentState)
@@ -215,15 +261,17 @@ def build_graph():
     g.add_node("build_itinerary", build_plan)
     g.add_node("estimate_budget", compute_budget)
     g.add_node("validate_adjust", validate_and_adjust)
+    g.add_node("build_checklist", make_checklist)
     g.add_node("finalize", finalize)
 
     g.set_entry_point("parse_request")
     g.add_edge("parse_request", "propose_options")
     g.add_edge("propose_options", "choose_destination")
     g.add_edge("choose_destination", "build_itinerary")
+    g.add_edge("choose_destination", "build_checklist")
     g.add_edge("build_itinerary", "estimate_budget")
     g.add_edge("estimate_budget", "validate_adjust")
-    g.add_edge("validate_adjust", "finalize")
+    g.add_edge(["validate_adjust", "build_checklist"], "finalize")
     g.add_edge("finalize", END)
 
     return g.compile()
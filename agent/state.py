@@ -1,4 +1,5 @@
-from typing import Any, Dict, List, Optional, TypedDict
+import operator
+from typing import Annotated, Any, Dict, List, Optional, TypedDict
 
 class AgentState(TypedDict, total=False):
     user_request: str
@@ -12,4 +13,4 @@ class AgentState(TypedDict, total=False):
     checklist: Optional[List[str]]
 
     final_plan: str
-    history: List[Dict[str, Any]]
+    history: Annotated[List[Dict[str, Any]], operator.add]
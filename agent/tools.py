@@ -1,26 +1,83 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
-import pandas as pd
+import csv
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
 
 DEST_CSV = "data/destinations.csv"
 ATTR_CSV = "data/attractions.csv"
 
+def _read_rows(path: str) -> List[Dict[str, Any]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    # Per-column dtype inference, like read_csv: int if every value parses, else float, else str
+    for col in (rows[0] if rows else {}):
+        for cast in (int, float):
+            try:
+                vals = [cast(r[col]) for r in rows]
+            except ValueError:
+                continue
+            for r, v in zip(rows, vals):
+                r[col] = v
+            break
+    return rows
+
+# The CSVs are small lookups; parse each into column arrays (plus the typed
+# rows for building results) and reuse that until the file changes. The mtime
+# argument only keys the cache, so an edited file is re-read on the next call.
+# Callers must copy rows before handing them out.
+@lru_cache(maxsize=1)
+def _load_dest(mtime: float) -> Dict[str, Any]:
+    rows = _read_rows(DEST_CSV)
+    return {
+        "rows": rows,
+        "region": np.array([str(r["region"]).lower() for r in rows]),
+        "tag_sets": [frozenset(t.strip() for t in str(r["style_tags"]).lower().split(",")) for r in rows],
+        "avg_lodging_per_night": np.array([r["avg_lodging_per_night"] for r in rows], dtype=float),
+    }
+
+@lru_cache(maxsize=1)
+def _load_attr(mtime: float) -> Dict[str, Any]:
+    rows = _read_rows(ATTR_CSV)
+    return {
+        "rows": rows,
+        "city": np.array([str(r["city"]).lower() for r in rows]),
+        "tag": [str(r["tag"]).lower() for r in rows],
+        "cost_est": np.array([r["cost_est"] for r in rows], dtype=float),
+    }
+
+# One compiled union per interest combination; a single regex scan per tag
+# replaces the any(i in tag ...) loop
+@lru_cache(maxsize=64)
+def _interest_re(interests: Tuple[str, ...]) -> re.Pattern:
+    return re.compile("|".join(map(re.escape, interests)))
+
+# Indices of the k smallest ranks, in stable sorted order, without sorting every row
+def _top_k(rank: np.ndarray, k: int) -> np.ndarray:
+    cand = np.arange(len(rank))
+    if 0 < k < len(rank):
+        # O(n) selection; keep every tie at the cut so the result matches a full stable sort
+        cut = np.partition(rank, k - 1)[k - 1]
+        cand = cand[rank <= cut]
+    return cand[np.argsort(rank[cand], kind="stable")][:k]
+
 def search_destinations(region: Optional[str], interests: List[str]) -> List[Dict[str, Any]]:
-    df = pd.read_csv(DEST_CSV)
+    d = _load_dest(os.path.getmtime(DEST_CSV))
+    idx = np.arange(len(d["rows"]))
     if region:
-        df = df[df["region"].str.lower() == region.lower()]
+        idx = idx[d["region"] == region.lower()]
 
     # Score by tag overlap
-    def score_tags(row) -> int:
-        tags = str(row["style_tags"]).lower().split(",")
-        tags = [t.strip() for t in tags]
-        return sum(1 for i in interests if i.lower() in tags)
-
-    df["score"] = df.apply(score_tags, axis=1)
-    df = df.sort_values(["score", "avg_lodging_per_night"], ascending=[False, True])
+    wanted = {i.lower() for i in interests}
+    tag_sets = d["tag_sets"]
+    score = np.array([len(wanted & tag_sets[i]) for i in idx], dtype=int)
 
-    return df.head(4).to_dict(orient="records")
+    # Highest score first, then cheapest lodging
+    order = np.lexsort((d["avg_lodging_per_night"][idx], -score))[:4]
+    return [{**d["rows"][idx[k]], "score": int(score[k])} for k in order]
 
 def propose_trip_concepts(constraints: Dict[str, Any], candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     interests = constraints.get("interests", [])
@@ -39,20 +96,28 @@ def propose_trip_concepts(constraints: Dict[str, Any], candidates: List[Dict[str
     return concepts
 
 def build_itinerary(city: str, days: int, interests: List[str], pace: str) -> Dict[str, Any]:
-    df = pd.read_csv(ATTR_CSV)
-    df = df[df["city"].str.lower() == city.lower()].copy()
-
-    # Prefer attractions matching interests; otherwise fallback to any
-    if interests:
-        df["match"] = df["tag"].str.lower().apply(lambda t: 1 if any(i.lower() in t for i in interests) else 0)
-        df = df.sort_values(["match", "cost_est"], ascending=[False, True])
-    else:
-        df = df.sort_values(["cost_est"], ascending=[True])
+    a = _load_attr(os.path.getmtime(ATTR_CSV))
+    sel = np.flatnonzero(a["city"] == city.lower())
+    cost = a["cost_est"][sel]
 
     # Pace controls number of blocks/day
     blocks_per_day = {"slow": 2, "medium": 3, "fast": 4}.get(pace, 3)
+    need = max(days * blocks_per_day, 0)
+
+    # Prefer attractions matching interests; otherwise fallback to any.
+    # Only the rows that fit in the plan are materialized.
+    if interests:
+        search = _interest_re(tuple(i.lower() for i in interests)).search
+        tags = a["tag"]
+        match = np.array([1 if search(tags[j]) else 0 for j in sel], dtype=int)
+        # Fold (match desc, cost asc) into one ascending rank
+        span = cost.max() - cost.min() + 1 if len(cost) else 1
+        order = _top_k(cost - match * span, need)
+        items = [{**a["rows"][sel[k]], "match": int(match[k])} for k in order]
+    else:
+        order = _top_k(cost, need)
+        items = [dict(a["rows"][sel[k]]) for k in order]
 
-    items = df.to_dict(orient="records")
     plan = []
     idx = 0
     for d in range(1, days + 1):
@@ -66,21 +131,41 @@ def build_itinerary(city: str, days: int, interests: List[str], pace: str) -> Di
 
     return {"city": city, "days": days, "pace": pace, "plan": plan}
 
-def estimate_budget(destination: Dict[str, Any], days: int, travelers: int, flight_est_per_person: float) -> Dict[str, Any]:
-    lodging = float(destination["avg_lodging_per_night"]) * (days - 1)  # nights
-    food = float(destination["avg_food_per_day"]) * days * travelers
-    local = float(destination["avg_local_transport_per_day"]) * days * travelers
-    flights = float(flight_est_per_person) * travelers
+@lru_cache(maxsize=256)
+def _estimate_budget_cached(lodging_per_night: float, food_per_day: float, local_per_day: float, days: int, travelers: int, flight_est_per_person: float) -> Tuple[float, float, float, float, float]:
+    lodging = lodging_per_night * (days - 1)  # nights
+    food = food_per_day * days * travelers
+    local = local_per_day * days * travelers
+    flights = flight_est_per_person * travelers
 
     total = lodging + food + local + flights
+    return round(lodging, 2), round(food, 2), round(local, 2), round(flights, 2), round(total, 2)
+
+def estimate_budget(destination: Dict[str, Any], days: int, travelers: int, flight_est_per_person: float) -> Dict[str, Any]:
+    # Cached on hashable primitives; the dict is rebuilt each call since callers extend it
+    lodging, food, local, flights, total = _estimate_budget_cached(
+        float(destination["avg_lodging_per_night"]),
+        float(destination["avg_food_per_day"]),
+        float(destination["avg_local_transport_per_day"]),
+        days,
+        travelers,
+        float(flight_est_per_person),
+    )
     return {
-        "lodging": round(lodging, 2),
-        "food": round(food, 2),
-        "local_transport": round(local, 2),
-        "flights_est": round(flights, 2),
-        "total_est": round(total, 2),
+        "lodging": lodging,
+        "food": food,
+        "local_transport": local,
+        "flights_est": flights,
+        "total_est": total,
     }
 
+# estimate_budget's total for many destinations at once, as one array expression
+def estimate_totals(destinations: List[Dict[str, Any]], days: int, travelers: int, flight_est_per_person: float) -> np.ndarray:
+    lodging = np.array([d["avg_lodging_per_night"] for d in destinations], dtype=float)
+    food = np.array([d["avg_food_per_day"] for d in destinations], dtype=float)
+    local = np.array([d["avg_local_transport_per_day"] for d in destinations], dtype=float)
+    return lodging * (days - 1) + (food + local) * (days * travelers) + float(flight_est_per_person) * travelers
+
 def estimate_activity_cost(itinerary: Dict[str, Any]) -> float:
     total = 0.0
     for day in itinerary["plan"]:
@@ -88,20 +173,45 @@ def estimate_activity_cost(itinerary: Dict[str, Any]) -> float:
             total += float(it["cost_est"])
     return round(total, 2)
 
+# 0-1 knapsack over unit-weight items: the indices of exactly min(capacity, n)
+# items with the highest total value. Ties keep the earlier items.
+def _pick_paid(values: List[float], capacity: int) -> List[int]:
+    n = len(values)
+    k = max(min(capacity, n), 0)
+    # dp[i, j]: best value using exactly j of the first i items; each item
+    # updates a whole row at once instead of looping over j in Python
+    dp = np.full((n + 1, k + 1), -np.inf)
+    dp[0, 0] = 0.0
+    for i, v in enumerate(values, start=1):
+        dp[i] = dp[i - 1]
+        np.maximum(dp[i - 1, 1:], dp[i - 1, :-1] + v, out=dp[i, 1:])
+
+    chosen = []
+    j = k
+    for i in range(n, 0, -1):
+        if j and dp[i, j] != dp[i - 1, j]:
+            chosen.append(i - 1)
+            j -= 1
+    return chosen[::-1]
+
 def adjust_itinerary_for_budget(itinerary: Dict[str, Any], max_paid_activities: int) -> Dict[str, Any]:
-    # Keep only first N paid items; free items remain.
-    paid_seen = 0
-    for day in itinerary["plan"]:
-        new_items = []
-        for it in day["items"]:
-            cost = float(it["cost_est"])
-            if cost <= 0:
-                new_items.append(it)
-                continue
-            if paid_seen < max_paid_activities:
-                new_items.append(it)
-                paid_seen += 1
-        day["items"] = new_items
+    # Keep the N most interest-matching paid items (cheapest on ties); free items remain.
+    paid = [
+        (d, i, float(it["cost_est"]), it.get("match", 0))
+        for d, day in enumerate(itinerary["plan"])
+        for i, it in enumerate(day["items"])
+        if float(it["cost_est"]) > 0
+    ]
+    # Scale match above any possible cost sum so match always wins, then cost breaks ties
+    scale = sum(p[2] for p in paid) + 1
+    picks = _pick_paid([match * scale - cost for _, _, cost, match in paid], max_paid_activities)
+    keep = {(paid[p][0], paid[p][1]) for p in picks}
+
+    for d, day in enumerate(itinerary["plan"]):
+        day["items"] = [
+            it for i, it in enumerate(day["items"])
+            if float(it["cost_est"]) <= 0 or (d, i) in keep
+        ]
     return itinerary
 
 def build_checklist(constraints: Dict[str, Any], destination: Dict[str, Any]) -> List[str]:
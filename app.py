@@ -1,10 +1,24 @@
+import asyncio
+import os
 import streamlit as st
 from agent.graph import build_graph
+from agent.tools import ATTR_CSV, DEST_CSV
 
 st.set_page_config(page_title="Vacation Planner Agent", layout="wide")
 
+@st.cache_resource
+def _get_graph():
+    return build_graph()
+
+# The pipeline is deterministic for a given request and data files, so repeat
+# runs are served from cache. The CSV mtimes are part of the key: editing data/
+# misses here, and the table loaders in agent/tools.py re-read the changed file.
+@st.cache_data(show_spinner=False)
+def _run_pipeline(user_request: str, data_mtimes: tuple):
+    return asyncio.run(_get_graph().ainvoke({"user_request": user_request, "history": []}))
+
 st.title("Vacation Planner Agent (LangGraph + Tools + Memory)")
-st.caption("Agentic workflow: parse → propose → choose → plan → budget → adjust → finalize")
+st.caption("Agentic workflow: parse → propose → choose → (plan → budget → adjust | checklist) → finalize")
 
 default_prompt = (
     "Plan a 5-day trip in March for 2 people, budget $1800, "
@@ -20,15 +34,14 @@ with col2:
     show_trace = st.checkbox("Show agent trace", value=True)
 
 if run_btn:
-    graph = build_graph()
-    out = graph.invoke({"user_request": user_request})
+    out = _run_pipeline(user_request, (os.path.getmtime(DEST_CSV), os.path.getmtime(ATTR_CSV)))
 
     st.subheader("Final Output")
     st.markdown(out["final_plan"])
 
     if show_trace:
         st.subheader("Trace (what the agent did)")
-        for i, h in enumerate(out.get("history", []), start=1):
+        for i, h in enumerate(out["history"], start=1):
             with st.expander(f"Step {i}: {h.get('node', 'unknown')}"):
                 st.json(h, expanded=False)
 